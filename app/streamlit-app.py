@@ -12,33 +12,153 @@ Streamlit is used for the web interface and session state management.
 Author: Matthew R. DeVerna
 """
 
+import asyncio
+import hashlib
 import json
+import openai
 import os
 import praw
+import sqlite3
+import threading
 import time
 
+import numpy as np
 import streamlit as st
 
-from openai import OpenAI
-from pydantic import BaseModel
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from jiter import from_json
+from openai import AsyncOpenAI, OpenAI
+from pathlib import Path
+from pydantic import BaseModel, ValidationError
 
 FETCH_COOLDOWN = 60
+MODEL = "gpt-4o-2024-08-06"
+FAST_MODEL = "gpt-4o-mini"
+
+# Longer post text is truncated before being sent to the model
+MAX_SELFTEXT_CHARS = 8000
+
+# Seconds between status checks on a submitted OpenAI batch
+BATCH_POLL_INTERVAL = 30
+# Consecutive failed status checks before a batch is given up on
+BATCH_MAX_POLL_FAILURES = 5
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# On-disk cache of raw OpenAI responses and finished analyses, shared across
+# sessions and restarts
+CACHE_DB = Path(".cmv_cache.sqlite")
+
+# Number of persisted analyses restored when a new session starts
+RECENT_ANALYSES = 10
+
+# Posts whose embeddings are at least this similar reuse an earlier analysis
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.92
+
+# Per-request timeout (seconds) and retry count for the OpenAI clients, which
+# retry connection errors, 429s, and 5xx responses with exponential backoff
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 3
+
+# Maximum number of concurrent OpenAI requests when prefetching
+MAX_CONCURRENCY = 10
+
+# While streaming, the counter-argument is re-parsed after this many new
+# characters rather than on every token
+COUNTER_KEY = '"counter_argument"'
+STREAM_PARSE_CHARS = 40
+
+
+@dataclass(frozen=True)
+class CMVPost:
+    """
+    The fields of a CMV submission used by the app, detached from PRAW so it
+    is cheap to store in session state and safe to pickle.
+    """
+
+    id: str
+    title: str
+    selftext: str
+    permalink: str
 
 
 # Build a structured JSON model for
-class CMV_argument(BaseModel):
+class CMV_full(BaseModel):
     main_position: str
     rationale: list[str]
+    counter_argument: str
+
+
+def _response_format():
+    schema = CMV_full.model_json_schema()
+    schema["additionalProperties"] = False
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "CMV_full", "schema": schema, "strict": True},
+    }
+
+
+# Raw response_format for requests that bypass the SDK's pydantic parsing
+RESPONSE_FORMAT = _response_format()
+
+SYSTEM_PROMPT = """
+You are a helpful assistant.
+You will be presented with a post from the subreddit r/changemyview.
+First, extract the main argument of the poster, as well as the key rationale
+that they feel supports their position.
+Then, be extremely persuasive and argue against that position.
+Be polite but make sure to address each point of rationale to counter the main argument.
+Use evidence-based arguments as much as possible and provide realistic alternatives.
+Structure and style your counter-argument like it is a post for the r/changemyview subreddit.
+Return the extraction AND the counter-argument in a single response, in the following JSON format:
+{
+    "main_position": "The main argument of the poster",
+    "rationale": ["Point 1", "Point 2", "Point 3"],
+    "counter_argument": "Your counter-argument"
+}
+"""
+
+
+@st.cache_resource
+def get_reddit():
+    """
+    Return the Reddit API client, created once per process.
+
+    Returns:
+    praw.Reddit: Authenticated Reddit client
+    """
+    return praw.Reddit(
+        client_id=os.environ.get("REDDIT_CLIENT_ID"),
+        client_secret=os.environ.get("REDDIT_CLIENT_SECRET"),
+        password=os.environ.get("REDDIT_PASSWORD"),
+        user_agent="python:changemyview_llm:v1.0 (by /u/double-o-ai-science)",
+        username=os.environ.get("REDDIT_USERNAME"),
+    )
 
 
-# Initialize Reddit API client
-reddit = praw.Reddit(
-    client_id=os.environ.get("REDDIT_CLIENT_ID"),
-    client_secret=os.environ.get("REDDIT_CLIENT_SECRET"),
-    password=os.environ.get("REDDIT_PASSWORD"),
-    user_agent="python:changemyview_llm:v1.0 (by /u/double-o-ai-science)",
-    username=os.environ.get("REDDIT_USERNAME"),
-)
+@st.cache_resource
+def get_openai(api_key):
+    """
+    Return a synchronous OpenAI client for an API key, created once per process
+    so its connection pool is reused across reruns.
+
+    Args:
+    api_key (str): OpenAI API key
+
+    Returns:
+    openai.OpenAI: OpenAI client
+    """
+    return OpenAI(api_key=api_key, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT)
+
+
+# Listing for each sort option; unknown options fall back to "top"
+_SORTERS = {
+    "new": lambda s, limit, t: s.new(limit=limit),
+    "hot": lambda s, limit, t: s.hot(limit=limit),
+    "rising": lambda s, limit, t: s.rising(limit=limit),
+    "top": lambda s, limit, t: s.top(time_filter=t, limit=limit),
+}
 
 
 @st.cache_data(ttl=3600)
@@ -52,121 +172,687 @@ def get_cmv_submissions(sort_by="top", time_filter="all", limit=5):
     limit (int): Number of submissions to fetch
 
     Returns:
-    list: List of PRAW submission objects
-    """
-    subreddit = reddit.subreddit("changemyview")
-    if sort_by == "new":
-        return list(subreddit.new(limit=limit))
-    elif sort_by == "hot":
-        return list(subreddit.hot(limit=limit))
-    elif sort_by == "rising":
-        return list(subreddit.rising(limit=limit))
-    elif sort_by == "top":
-        return list(subreddit.top(time_filter=time_filter, limit=limit))
-    else:
-        return list(subreddit.top(time_filter=time_filter, limit=limit))
+    list: List of CMVPost objects
+    """
+    subreddit = get_reddit().subreddit("changemyview")
+    sorter = _SORTERS.get(sort_by, _SORTERS["top"])
+    submissions = list(sorter(subreddit, limit, time_filter))
+
+    # Read every field now so later reruns never trigger PRAW lazy loads
+    return [
+        CMVPost(id=s.id, title=s.title, selftext=s.selftext, permalink=s.permalink)
+        for s in submissions
+    ]
 
 
-def extract_main_argument(_submission):
+def cache_key(model, system_content, user_content, submission_id=""):
     """
-    Extract the main argument and rationale from a CMV submission using OpenAI's GPT model.
+    Build a stable cache key for an OpenAI request.
 
     Args:
-    _submission (praw.models.Submission): Reddit submission object
+    model (str): Model name
+    system_content (str): System prompt
+    user_content (str): User prompt
+    submission_id (str): Reddit submission id, if the prompt is tied to one
 
     Returns:
-    dict: Analysis containing main_position and rationale
-    """
-    title = _submission.title
-    text = _submission.selftext
-
-    system_content = """
-    You are a helpful assistant. 
-    You will be presented with a post from the subreddit r/changemyview and your
-    task is to extract the main argument of the poster, as well as the key rationale
-    that they feel supports their position. 
-    Return your response in the following JSON format:
-    {
-        "main_position": "The main argument of the poster",
-        "rationale": ["Point 1", "Point 2", "Point 3"]
-    }
+    str: Hex digest identifying the request
     """
-    user_content = f"TITLE: {title}.\nTEXT: {text}"
+    h = hashlib.blake2b()
+    for part in (model, submission_id, system_content, user_content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
 
-    response = client.beta.chat.completions.parse(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": user_content},
-        ],
-        response_format=CMV_argument,
-        temperature=0,
+
+def _connect_cache():
+    con = sqlite3.connect(CACHE_DB)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT)"
     )
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS analyses "
+        "(id TEXT PRIMARY KEY, post JSON, analysis JSON, counter TEXT, "
+        "model TEXT, ts INTEGER)"
+    )
+    # Caches created before analyses recorded their model lack the column
+    columns = {row[1] for row in con.execute("PRAGMA table_info(analyses)")}
+    if "model" not in columns:
+        con.execute("ALTER TABLE analyses ADD COLUMN model TEXT")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings (id TEXT PRIMARY KEY, vector BLOB)"
+    )
+    return con
 
-    try:
-        analysis = json.loads(response.choices[0].message.content)
-    except json.JSONDecodeError:
-        st.error("Failed to parse the analysis response. Using a default structure.")
-        analysis = {
-            "main_position": "Could not extract main position",
-            "rationale": ["Could not extract rationale"],
-        }
 
-    return analysis
+def cache_get(key):
+    """
+    Look up a cached response.
+
+    Args:
+    key (str): Cache key from cache_key()
+
+    Returns:
+    str or None: The cached response content, if present
+    """
+    with closing(_connect_cache()) as con:
+        row = con.execute(
+            "SELECT content FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def cache_set(key, content):
+    """
+    Store a response in the cache.
+
+    Args:
+    key (str): Cache key from cache_key()
+    content (str): Raw response content
+    """
+    with closing(_connect_cache()) as con, con:
+        con.execute(
+            "INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)",
+            (key, content),
+        )
 
 
-def generate_counter_argument(analysis):
+def save_analysis(submission, analysis, counter_argument, model):
     """
-    Generate a counter-argument based on the analysis of a CMV submission.
+    Persist a finished analysis so it survives page reloads and restarts.
 
     Args:
+    submission (CMVPost): CMV submission
     analysis (dict): Analysis containing main_position and rationale
+    counter_argument (str): Generated counter-argument
+    model (str): OpenAI model that produced the analysis
+    """
+    with closing(_connect_cache()) as con, con:
+        con.execute(
+            "INSERT OR REPLACE INTO analyses "
+            "(id, post, analysis, counter, model, ts) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                submission.id,
+                json.dumps(asdict(submission)),
+                json.dumps(analysis),
+                counter_argument,
+                model,
+                int(time.time()),
+            ),
+        )
+
+
+def load_recent_analyses(limit=RECENT_ANALYSES):
+    """
+    Load the most recently persisted analyses.
+
+    Args:
+    limit (int): Maximum number of analyses to load
+
+    Returns:
+    list: (CMVPost, analysis dict, counter_argument string) tuples, newest first
+    """
+    with closing(_connect_cache()) as con:
+        rows = con.execute(
+            "SELECT post, analysis, counter FROM analyses ORDER BY ts DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    return [
+        (CMVPost(**json.loads(post)), json.loads(analysis), counter)
+        for post, analysis, counter in rows
+    ]
+
+
+def embedding_text(_submission):
+    """
+    Return the text embedded to find posts similar to a CMV submission.
+
+    Args:
+    _submission (CMVPost): CMV submission
+
+    Returns:
+    str: Title and (truncated) text of the post
+    """
+    return f"{_submission.title}\n{_truncate(_submission.selftext)}"
+
+
+def save_embedding(submission_id, vector):
+    """
+    Store a submission's embedding for later similarity lookups.
+
+    Args:
+    submission_id (str): Reddit submission id
+    vector (list): Embedding of the submission from embedding_text()
+    """
+    with closing(_connect_cache()) as con, con:
+        con.execute(
+            "INSERT OR REPLACE INTO embeddings (id, vector) VALUES (?, ?)",
+            (submission_id, np.asarray(vector, dtype=np.float32).tobytes()),
+        )
+
+
+def find_similar_analysis(submission_id, vector, model):
+    """
+    Return the analysis of the most similar previously analyzed post, if it is
+    similar enough to reuse.
+
+    Args:
+    submission_id (str): Reddit submission id, excluded from the search
+    vector (list): Embedding of the submission from embedding_text()
+    model (str): Only analyses produced by this OpenAI model are considered
 
     Returns:
-    str: Generated counter-argument
+    tuple or None: (analysis dict, counter_argument string) of the closest post
+        with similarity above SIMILARITY_THRESHOLD, otherwise None
     """
-    rationale_str = "\n".join(
-        [f"{i+1}. {r}" for i, r in enumerate(analysis["rationale"])]
+    query = np.asarray(vector, dtype=np.float32)
+    with closing(_connect_cache()) as con:
+        rows = con.execute(
+            "SELECT e.vector, a.analysis, a.counter FROM embeddings e "
+            "JOIN analyses a ON a.id = e.id WHERE e.id != ? AND a.model = ?",
+            (submission_id, model),
+        ).fetchall()
+    if not rows:
+        return None
+
+    matrix = np.frombuffer(b"".join(row[0] for row in rows), dtype=np.float32)
+    matrix = matrix.reshape(len(rows), -1)
+    similarity = matrix @ query / (
+        np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
     )
+    best = int(np.argmax(similarity))
+    if similarity[best] < SIMILARITY_THRESHOLD:
+        return None
+    return json.loads(rows[best][1]), rows[best][2]
+
+
+def openai_user_id(api_key):
+    """
+    Return a stable, non-reversible identifier for an API key.
+
+    Args:
+    api_key (str): OpenAI API key of the client making the request
+
+    Returns:
+    str: Hex digest to send as the request's user
+    """
+    return hashlib.blake2b(api_key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _truncate(text, max_chars=MAX_SELFTEXT_CHARS):
+    """
+    Shorten overly long post text, keeping its opening and closing, where CMV
+    posters usually state their thesis.
+
+    Args:
+    text (str): Post text
+    max_chars (int): Length above which the text is truncated
+
+    Returns:
+    str: The text, truncated to roughly max_chars if it was longer
+    """
+    if len(text) <= max_chars:
+        return text
+    tail = max_chars // 4
+    return text[: max_chars - tail] + "\n...[truncated]...\n" + text[-tail:]
+
+
+def build_messages(_submission):
+    """
+    Build the chat messages used to analyze a CMV submission.
+
+    Args:
+    _submission (CMVPost): CMV submission
+
+    Returns:
+    list: Chat messages for the OpenAI API
+    """
+    text = _truncate(_submission.selftext)
+    user_content = f"TITLE: {_submission.title}.\nTEXT: {text}"
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def submission_cache_key(_submission, messages, model):
+    """
+    Build the response cache key for analyzing a CMV submission.
+
+    Args:
+    _submission (CMVPost): CMV submission
+    messages (list): Chat messages from build_messages()
+    model (str): OpenAI model used for the analysis
+
+    Returns:
+    str: Cache key for the analysis request
+    """
+    return cache_key(model, SYSTEM_PROMPT, messages[1]["content"], _submission.id)
+
+
+def split_analysis(result):
+    """
+    Split a CMV_full result into the analysis and counter-argument.
+
+    Args:
+    result (CMV_full): Parsed response
+
+    Returns:
+    tuple: (analysis dict with a preformatted _rationale_str, counter_argument string)
+    """
+    analysis = result.model_dump(exclude={"counter_argument"})
+    counter_argument = result.counter_argument
 
-    system_content = """
-    You are a helpful assistant. 
-    You will be presented with an argument from the subreddit r/changemyview along
-    with the central rationale presented to support that argument.
-    Your task is to be extremely persuasive and argue against that position.
-    Be polite but make sure to address each point of rationale to counter the main argument.
-    Use evidence-based arguments as much as possible and provide realistic alternatives.
-    Structure and style your response like it is a post for the r/changemyview subreddit.
-    """
-    user_content = (
-        f"MAIN ARGUMENT: {analysis['main_position']}.\nRATIONALE: {rationale_str}"
+    # Format the rationale once rather than on every rerun
+    analysis["_rationale_str"] = "\n".join(
+        f"{i+1}. {r}" for i, r in enumerate(analysis["rationale"])
     )
+    return analysis, counter_argument
+
+
+def is_valid_analysis(content):
+    """
+    Check that a raw response is a complete CMV_full JSON object, and so is
+    safe to cache.
+
+    Args:
+    content (str or None): Raw response content
+
+    Returns:
+    bool: True if the content validates as CMV_full
+    """
+    if not content:
+        return False
+    try:
+        CMV_full.model_validate_json(content)
+    except ValidationError:
+        return False
+    return True
+
+
+def cached_analysis(key):
+    """
+    Look up a cached analysis response, ignoring entries that are not valid.
+
+    Invalid entries, such as truncated responses cached by older versions of
+    the app, count as a miss so the request is made again and overwrites them.
+
+    Args:
+    key (str): Cache key from submission_cache_key()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-2024-08-06",
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": user_content},
-        ],
+    Returns:
+    str or None: The cached CMV_full JSON, if present and valid
+    """
+    content = cache_get(key)
+    return content if is_valid_analysis(content) else None
+
+
+def parse_analysis(content):
+    """
+    Split a raw CMV_full JSON response into the analysis and counter-argument.
+
+    Args:
+    content (str): Raw JSON response content
+
+    Returns:
+    tuple or None: (analysis dict with a preformatted _rationale_str,
+        counter_argument string), or None if the content is not valid
+    """
+    try:
+        result = CMV_full.model_validate_json(content)
+    except ValidationError:
+        st.error("Failed to parse the analysis response.")
+        return None
+    return split_analysis(result)
+
+
+def reuse_similar_analysis(_submission, key, model):
+    """
+    Reuse the analysis of a near-duplicate post, if one has been analyzed.
+
+    The post is embedded and its embedding stored. A reused analysis is also
+    cached under the post's own response cache key, so later lookups skip
+    the embedding. The embedding is cheap next to the analysis, and a failed
+    embedding request just skips the lookup.
+
+    Args:
+    _submission (CMVPost): CMV submission
+    key (str): Response cache key for the submission's analysis
+    model (str): OpenAI model used for the analysis
+
+    Returns:
+    str or None: CMV_full JSON of the reused analysis, or None if there is no
+        similar enough post
+    """
+    try:
+        embedding = sync_client.embeddings.create(
+            model=EMBEDDING_MODEL, input=embedding_text(_submission)
+        )
+    except openai.APIError:
+        return None
+    vector = embedding.data[0].embedding
+    save_embedding(_submission.id, vector)
+
+    similar = find_similar_analysis(_submission.id, vector, model)
+    if similar is None:
+        return None
+    analysis, counter_argument = similar
+    content = CMV_full(
+        main_position=analysis["main_position"],
+        rationale=analysis["rationale"],
+        counter_argument=counter_argument,
+    ).model_dump_json()
+    cache_set(key, content)
+    return content
+
+
+async def analyze_submission(async_client, _submission, model=MODEL):
+    """
+    Analyze a CMV submission using OpenAI's GPT model.
+
+    The main argument, its rationale, and the counter-argument are all
+    produced by a single structured request, unless a near-duplicate post
+    has already been analyzed.
+
+    Args:
+    async_client (openai.AsyncOpenAI): Async OpenAI client for the running loop
+    _submission (CMVPost): CMV submission
+    model (str): OpenAI model used for the analysis
+
+    Returns:
+    tuple or None: (analysis dict, counter_argument string), or None if the
+        model refused to analyze the post
+    """
+    messages = build_messages(_submission)
+    key = submission_cache_key(_submission, messages, model)
+    content = cached_analysis(key)
+    if content is None:
+        content = await asyncio.to_thread(
+            reuse_similar_analysis, _submission, key, model
+        )
+    if content is None:
+        response = await async_client.beta.chat.completions.parse(
+            model=model,
+            messages=messages,
+            response_format=CMV_full,
+            temperature=0,
+            user=openai_user_id(async_client.api_key),
+        )
+        message = response.choices[0].message
+        if message.refusal:
+            st.error(f"The model declined to analyze this post: {message.refusal}")
+            return None
+        cache_set(key, message.content)
+        return split_analysis(message.parsed)
+
+    return parse_analysis(content)
+
+
+def _partial_counter_argument(content, counter_start):
+    """
+    Parse the (possibly incomplete) counter_argument value from a streamed
+    response.
+
+    Args:
+    content (str): Response content received so far
+    counter_start (int): Offset of COUNTER_KEY in content
+
+    Returns:
+    str: The counter-argument text received so far
+    """
+    tail = ("{" + content[counter_start:]).encode("utf-8")
+    partial = from_json(tail, partial_mode="trailing-strings")
+    return partial.get("counter_argument", "")
+
+
+def stream_counter_argument(_submission, outcome, model=MODEL):
+    """
+    Analyze a CMV submission, yielding the counter-argument as it is generated.
+
+    The structured response is parsed as it streams in, and only the text
+    of the counter_argument field is yielded. Cached responses and those of
+    near-duplicate posts are yielded in one piece.
+
+    Args:
+    _submission (CMVPost): CMV submission
+    outcome (dict): Receives the raw response content under "content", for
+        parse_analysis(), and the model's refusal, if any, under "refusal"
+    model (str): OpenAI model used for the analysis
+
+    Yields:
+    str: The next piece of the counter-argument
+    """
+    messages = build_messages(_submission)
+    key = submission_cache_key(_submission, messages, model)
+    content = cached_analysis(key)
+    if content is None:
+        content = reuse_similar_analysis(_submission, key, model)
+    if content is not None:
+        outcome["content"] = content
+        yield parse_analysis(content)[1]
+        return
+
+    stream = sync_client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=RESPONSE_FORMAT,
         temperature=0,
+        user=openai_user_id(sync_client.api_key),
+        stream=True,
     )
+    content = ""
+    finish_reason = None
+    counter_start = -1
+    parsed_length = 0
+    written = 0
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        if choice.delta.refusal:
+            outcome["refusal"] = outcome.get("refusal", "") + choice.delta.refusal
+        if not choice.delta.content:
+            continue
+        scan_from = max(0, len(content) - len(COUNTER_KEY))
+        content += choice.delta.content
+
+        # counter_argument is the last field, so skip parsing until it starts,
+        # scanning only the newly arrived text for its key
+        if counter_start < 0:
+            counter_start = content.find(COUNTER_KEY, scan_from)
+            if counter_start < 0:
+                continue
+
+        # Re-parse only the counter_argument tail, and only every few tokens
+        if len(content) - parsed_length < STREAM_PARSE_CHARS:
+            continue
+        parsed_length = len(content)
+        counter_argument = _partial_counter_argument(content, counter_start)
+        if len(counter_argument) > written:
+            yield counter_argument[written:]
+            written = len(counter_argument)
+
+    if counter_start >= 0:
+        counter_argument = _partial_counter_argument(content, counter_start)
+        if len(counter_argument) > written:
+            yield counter_argument[written:]
 
-    return response.choices[0].message.content
+    outcome["content"] = content
 
+    # Truncated or filtered streams leave incomplete JSON; never cache those
+    if finish_reason == "stop" and is_valid_analysis(content):
+        cache_set(key, content)
 
-def analyze_submission(_submission):
+
+async def analyze_many(submissions, api_key, model=MODEL):
     """
-    Analyze a CMV submission using OpenAI's GPT model.
+    Analyze several CMV submissions concurrently, at most MAX_CONCURRENCY
+    at a time.
+
+    The async client is created and closed here because its connection pool
+    is bound to the event loop of the asyncio.run() call that runs this.
 
     Args:
-    _submission (praw.models.Submission): Reddit submission object
+    submissions (list): List of CMVPost objects
+    api_key (str): OpenAI API key
+    model (str): OpenAI model used for the analysis
 
     Returns:
-    tuple: (analysis dict, counter_argument string)
+    list: One (analysis dict, counter_argument string) tuple per submission,
+        or the exception raised while analyzing it
     """
-    analysis = extract_main_argument(_submission)
-    counter_argument = generate_counter_argument(analysis)
-    return analysis, counter_argument
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async with AsyncOpenAI(
+        api_key=api_key, max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT
+    ) as async_client:
+
+        async def bounded(submission):
+            async with semaphore:
+                return await analyze_submission(async_client, submission, model)
+
+        tasks = [bounded(s) for s in submissions]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def submit_batch(submissions, model=MODEL):
+    """
+    Submit analyses for several CMV submissions through the OpenAI Batch API.
+
+    Batch requests cost half as much as real-time ones but may take up to
+    24 hours. Submissions that are already cached are resolved immediately
+    and not sent. Results are collected by a background thread.
+
+    Args:
+    submissions (list): List of CMVPost objects
+    model (str): OpenAI model used for the analysis
+
+    Returns:
+    dict: Batch job with keys id, status, model, total, and results, where results
+        maps submission ids to raw response content as they become available
+    """
+    job = {
+        "id": None,
+        "status": "completed",
+        "model": model,
+        "total": len(submissions),
+        "results": {},
+    }
+    keys = {}
+    lines = []
+    for submission in submissions:
+        messages = build_messages(submission)
+        key = submission_cache_key(submission, messages, model)
+        content = cached_analysis(key)
+        if content is not None:
+            job["results"][submission.id] = content
+            continue
+        keys[submission.id] = key
+        request = {
+            "custom_id": submission.id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": messages,
+                "response_format": RESPONSE_FORMAT,
+                "temperature": 0,
+                "user": openai_user_id(sync_client.api_key),
+            },
+        }
+        lines.append(json.dumps(request))
+
+    if not lines:
+        return job
+
+    batch_file = sync_client.files.create(
+        file=("cmv_batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = sync_client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    job["id"] = batch.id
+    job["status"] = batch.status
+
+    threading.Thread(
+        target=poll_batch, args=(sync_client, job, keys), daemon=True
+    ).start()
+    return job
+
+
+def poll_batch(batch_client, job, keys):
+    """
+    Poll an OpenAI batch until it finishes, then collect its results.
+
+    Runs in a background thread, so it only touches the job dict and the
+    response cache, never Streamlit state. After BATCH_MAX_POLL_FAILURES
+    consecutive API errors the job is marked failed and polling stops.
+
+    Args:
+    batch_client (openai.OpenAI): Synchronous OpenAI client
+    job (dict): Batch job returned by submit_batch()
+    keys (dict): Cache key for each submission id in the batch
+    """
+    failures = 0
+    while job["status"] not in BATCH_TERMINAL_STATUSES:
+        time.sleep(BATCH_POLL_INTERVAL)
+        try:
+            batch = batch_client.batches.retrieve(job["id"])
+        except openai.APIError:
+            failures += 1
+            if failures >= BATCH_MAX_POLL_FAILURES:
+                job["status"] = "failed"
+            continue
+        failures = 0
+        job["status"] = batch.status
+
+    if job["status"] != "completed" or not batch.output_file_id:
+        return
+
+    try:
+        output = batch_client.files.content(batch.output_file_id).text
+    except openai.APIError:
+        job["status"] = "failed"
+        return
+    for line in output.splitlines():
+        result = json.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        choice = response["body"]["choices"][0]
+        content = choice["message"].get("content")
+        if choice.get("finish_reason") != "stop" or choice["message"].get("refusal"):
+            continue
+        if not is_valid_analysis(content):
+            continue
+        cache_set(keys[result["custom_id"]], content)
+        job["results"][result["custom_id"]] = content
+
+
+def store_analysis(submission, analysis, counter_argument, model):
+    """
+    Record a finished analysis in session state and persist it to disk.
+
+    Args:
+    submission (CMVPost): CMV submission
+    analysis (dict): Analysis containing main_position and rationale
+    counter_argument (str): Generated counter-argument
+    model (str): OpenAI model that produced the analysis
+    """
+    if submission.id not in st.session_state:
+        st.session_state[submission.id] = {"visible": False}
+    st.session_state[submission.id].update(
+        {
+            "analyzed": True,
+            "analysis": analysis,
+            "counter_argument": counter_argument,
+        }
+    )
+    save_analysis(submission, analysis, counter_argument, model)
 
 
 def post_to_reddit(submission, counter_argument):
@@ -174,25 +860,115 @@ def post_to_reddit(submission, counter_argument):
     Post a counter-argument as a reply to a Reddit submission.
 
     Args:
-    submission (praw.models.Submission): Reddit submission object
+    submission (CMVPost): CMV submission
     counter_argument (str): The counter-argument to post
 
     Returns:
     bool: True if posted successfully, False otherwise
     """
     try:
-        submission.reply(counter_argument)
+        get_reddit().submission(id=submission.id).reply(counter_argument)
         return True
     except Exception as e:
         st.error(f"Failed to post comment: {str(e)}")
         return False
 
 
+def toggle_visibility(submission_id):
+    """
+    Show or hide a submission's analysis; unanalyzed posts are streamed on
+    display.
+
+    Args:
+    submission_id (str): Reddit submission id
+    """
+    state = st.session_state[submission_id]
+    state["visible"] = not state["visible"]
+
+
+@st.fragment
+def render_submission(submission, model=MODEL):
+    """
+    Render one submission with its Analyze/Hide toggle.
+
+    Runs as a fragment, so clicking the toggle reruns only this submission
+    rather than the whole app.
+
+    Args:
+    submission (CMVPost): CMV submission
+    model (str): OpenAI model used for the analysis
+    """
+    # Initialize session state for each submission
+    if submission.id not in st.session_state:
+        st.session_state[submission.id] = {
+            "analyzed": False,
+            "visible": False,
+            "analysis": None,
+            "counter_argument": None,
+        }
+    state = st.session_state[submission.id]
+
+    # Determine button text based on visibility state
+    button_text = "Hide" if state["visible"] else "Analyze"
+    button_label = f"{button_text}: {submission.title}"
+
+    # Create the button with improved readability
+    button_key = f"toggle_{submission.id}"
+    # The toggle runs as a callback, before this body, so the label is current
+    st.button(
+        button_label,
+        key=button_key,
+        on_click=toggle_visibility,
+        args=(submission.id,),
+    )
+
+    # Display analysis and counter-argument if visible
+    if state["visible"]:
+        # Display original submission
+        st.subheader("Original Submission")
+        st.write(f"**Title:** {submission.title}")
+        st.write(f"**Text:** {submission.selftext}")
+
+        # Reserve space so the analysis renders above the counter-argument
+        analysis_container = st.container()
+
+        # Display counter-argument, streaming it if not yet analyzed
+        st.subheader("Counter Argument")
+        if state["analyzed"]:
+            st.write(state["counter_argument"])
+        else:
+            outcome = {}
+            try:
+                st.write_stream(stream_counter_argument(submission, outcome, model))
+            except openai.APIError as e:
+                st.error(f"Failed to analyze submission: {str(e)}")
+                return
+            if outcome.get("refusal"):
+                st.error(
+                    f"The model declined to analyze this post: {outcome['refusal']}"
+                )
+                return
+
+            # Leave failed analyses unanalyzed so toggling the post retries
+            result = parse_analysis(outcome["content"])
+            if result is None:
+                return
+            store_analysis(submission, *result, model)
+
+        # Display analysis
+        analysis = state["analysis"]
+        with analysis_container:
+            st.subheader("Analysis")
+            st.write(f"**Main Position:** {analysis['main_position']}")
+            st.write("**Rationale:**")
+            st.markdown(analysis["_rationale_str"])
+
+
 def main():
     """
     Main function to run the Streamlit app.
     """
-    global client
+    global sync_client
     st.title("AI Persuasion Companion for CMV")
 
     # Add app description
@@ -215,43 +991,66 @@ def main():
 
     # Initialize OpenAI client if API key is provided
     if openai_api_key:
-        client = OpenAI(api_key=openai_api_key)
+        sync_client = get_openai(openai_api_key)
         st.success("OpenAI client initialized successfully!")
     else:
         st.warning("Please provide the OpenAI API key to proceed.")
         return
 
-    # Create container for sort options
-    sort_container = st.container()
+    fast_mode = st.sidebar.toggle(
+        "Fast mode",
+        help=f"Analyze posts with {FAST_MODEL} instead of {MODEL}. Cheaper and faster.",
+    )
+    model = FAST_MODEL if fast_mode else MODEL
+
+    # Add this before the "Fetch New Submissions" button
+    if "last_fetch_time" not in st.session_state:
+        st.session_state.last_fetch_time = 0
+
+    # Restore recent analyses so a reload skips Reddit and OpenAI
+    if "submissions" not in st.session_state:
+        recent = load_recent_analyses()
+        if recent:
+            st.session_state.submissions = [post for post, _, _ in recent]
+            for post, analysis, counter_argument in recent:
+                st.session_state[post.id] = {
+                    "analyzed": True,
+                    "visible": False,
+                    "analysis": analysis,
+                    "counter_argument": counter_argument,
+                }
 
-    # Create two columns within the container
-    col1, col2, col3 = sort_container.columns(3)
+    # Group the fetch options in a form so changing them doesn't rerun the app
+    with st.form("fetch_form"):
+        col1, col2, col3 = st.columns(3)
 
-    with col1:
-        fetch_items = [3, 5, 10]
-        limit = st.selectbox("Number of posts to fetch", fetch_items)
+        with col1:
+            fetch_items = [3, 5, 10]
+            limit = st.selectbox("Number of posts to fetch", fetch_items)
 
-    with col2:
-        sort_options = ["top", "new", "hot", "rising"]
-        selected_sort = st.selectbox("Sort submissions by:", sort_options, index=0)
+        with col2:
+            sort_options = ["top", "new", "hot", "rising"]
+            selected_sort = st.selectbox("Sort submissions by:", sort_options, index=0)
 
-    with col3:
-        if selected_sort == "top":
+        with col3:
+            # Forms don't rerun on change, so this is always shown and only
+            # applied when sorting by "top"
             time_filters = ["day", "week", "month", "year", "all"]
-            selected_time = st.selectbox("Time period:", time_filters, index=0)
-        else:
-            selected_time = "all"  # Default value when not using "top" sort
-            st.empty()  # Placeholder to maintain layout
+            selected_time = st.selectbox(
+                "Time period (top only):", time_filters, index=0
+            )
 
-    # Add this before the "Fetch New Submissions" button
-    if "last_fetch_time" not in st.session_state:
-        st.session_state.last_fetch_time = 0
+        prefetch_mode = st.radio(
+            "Analysis mode:",
+            ["Fast (real-time)", "Cheap (batch)"],
+            horizontal=True,
+            help="Batch analyses cost half as much but may take a while to arrive.",
+        )
 
-    # Replace the existing "Fetch New Submissions" button code with this:
-    fetch_button = st.button(
-        "Fetch New Submissions",
-        help="Please wait 60 seconds between fetching posts.",
-    )
+        fetch_button = st.form_submit_button(
+            "Fetch New Submissions",
+            help="Please wait 60 seconds between fetching posts.",
+        )
     if fetch_button:
         current_time = time.time()
         if current_time - st.session_state.last_fetch_time >= FETCH_COOLDOWN:
@@ -261,74 +1060,59 @@ def main():
                 )
             st.session_state.submissions = submissions
             st.session_state.last_fetch_time = current_time
+
+            # Forget any earlier batch; its thread still fills the response cache
+            st.session_state.pop("batch_job", None)
+
+            # Prefetch analyses for all submissions so each click is instant
+            if prefetch_mode == "Cheap (batch)":
+                try:
+                    with st.spinner("Submitting batch..."):
+                        st.session_state.batch_job = submit_batch(submissions, model)
+                except openai.APIError as e:
+                    # Posts stay unanalyzed and are analyzed in real time on click
+                    st.error(f"Failed to submit batch: {str(e)}")
+            else:
+                with st.spinner("Analyzing submissions..."):
+                    results = asyncio.run(
+                        analyze_many(submissions, openai_api_key, model)
+                    )
+                for submission, result in zip(submissions, results):
+                    if result is None or isinstance(result, Exception):
+                        # Leave it unanalyzed; clicking the post will retry
+                        continue
+                    store_analysis(submission, *result, model)
         else:
             remaining_time = int(
                 FETCH_COOLDOWN - (current_time - st.session_state.last_fetch_time)
             )
             st.warning(f"Please wait {remaining_time} seconds before fetching again.")
 
+    # Collect any batch results that arrived since the last rerun
+    if "batch_job" in st.session_state:
+        job = st.session_state.batch_job
+        for submission in st.session_state.get("submissions", []):
+            content = job["results"].get(submission.id)
+            if content is None:
+                continue
+            if st.session_state.get(submission.id, {}).get("analyzed"):
+                continue
+            result = parse_analysis(content)
+            if result is not None:
+                store_analysis(submission, *result, job["model"])
+        if job["status"] not in BATCH_TERMINAL_STATUSES:
+            st.info(
+                f"Batch {job['status']}: {len(job['results'])}/{job['total']} "
+                "analyses ready. Unfinished posts are analyzed in real time on click."
+            )
+            st.button("Check batch progress")
+        elif job["status"] != "completed":
+            st.warning(f"Batch {job['status']}. Posts will be analyzed on click.")
+
     # Display and process submissions
     if "submissions" in st.session_state:
         for submission in st.session_state.submissions:
-            # Initialize session state for each submission
-            if submission.id not in st.session_state:
-                st.session_state[submission.id] = {
-                    "analyzed": False,
-                    "visible": False,
-                    "analysis": None,
-                    "counter_argument": None,
-                }
-
-            # Determine button text based on visibility state
-            button_text = (
-                "Hide" if st.session_state[submission.id]["visible"] else "Analyze"
-            )
-            button_label = f"{button_text}: {submission.title}"
-
-            # Create the button with improved readability
-            button_key = f"toggle_{submission.id}"
-            if st.button(button_label, key=button_key):
-                is_analyzed = st.session_state[submission.id]["analyzed"]
-                if not is_analyzed:
-                    # Analyze the submission if not already done
-                    with st.spinner("Analyzing submission..."):
-                        analysis, counter_argument = analyze_submission(submission)
-                    st.session_state[submission.id]["analysis"] = analysis
-                    st.session_state[submission.id][
-                        "counter_argument"
-                    ] = counter_argument
-                    st.session_state[submission.id]["analyzed"] = True
-
-                # Toggle visibility
-                st.session_state[submission.id]["visible"] = not st.session_state[
-                    submission.id
-                ]["visible"]
-
-                # Force a rerun to update the button text immediately
-                st.rerun()
-
-            # Display analysis and counter-argument if visible
-            if st.session_state[submission.id]["visible"]:
-                analysis = st.session_state[submission.id]["analysis"]
-                counter_argument = st.session_state[submission.id]["counter_argument"]
-
-                # Display original submission
-                st.subheader("Original Submission")
-                st.write(f"**Title:** {submission.title}")
-                st.write(f"**Text:** {submission.selftext}")
-
-                # Display analysis and counter-argument only if analyzed
-                if st.session_state[submission.id]["analyzed"]:
-                    # Display analysis
-                    st.subheader("Analysis")
-                    st.write(f"**Main Position:** {analysis['main_position']}")
-                    st.write("**Rationale:**")
-                    for i, point in enumerate(analysis["rationale"], 1):
-                        st.write(f"{i}. {point}")
-
-                    # Display counter-argument
-                    st.subheader("Counter Argument")
-                    st.write(counter_argument)
+            render_submission(submission, model)
 
 
 if __name__ == "__main__":